@@ -1,31 +1,120 @@
+import os
+
+# Set the ASYNC_MODE environment variable to "threading", "eventlet" or
+# "gevent" to test the different async modes. The eventlet and gevent modes
+# monkey patch the standard library before anything else is imported, so that
+# sockets, locks and sleeps cooperate with the green thread hub.
+async_mode = os.environ.get('ASYNC_MODE', 'eventlet')
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from collections import defaultdict
+from datetime import timedelta
 from threading import Lock
-from flask import Flask, render_template, session, request, \
+import orjson
+from flask import Flask, render_template, request, \
     copy_current_request_context
 from flask_socketio import SocketIO, emit, join_room, leave_room, \
     close_room, rooms, disconnect
+from orjson_json import OrjsonJSON
 
-# Set this variable to "threading", "eventlet" or "gevent" to test the
-# different async modes, or leave it set to None for the application to choose
-# the best option based on installed packages.
-async_mode = None
+# Set the REDIS_URL environment variable to store receive counts in Redis
+# instead of in the process. Redis is then also used as the Socket.IO
+# message queue, so that broadcasts and room emits reach clients connected to
+# other server processes. To scale out, start several instances
+# with "gunicorn -k eventlet -w 1 --worker-connections 2000 app:app" behind a
+# load balancer with sticky sessions.
+REDIS_URL = os.environ.get('REDIS_URL')
+# receive counts of clients that went away without a disconnect expire
+COUNT_LIFETIME = timedelta(hours=1)
+
+# Per-packet Socket.IO and Engine.IO logging is off unless SOCKETIO_DEBUG=1.
+SOCKETIO_DEBUG = os.environ.get('SOCKETIO_DEBUG', '0') == '1'
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, async_mode=async_mode, logger=True, engineio_logger=True, cors_allowed_origins="*")
+redis_client = None
+if REDIS_URL:
+    import redis
+
+    redis_client = redis.Redis.from_url(REDIS_URL)
+socketio = SocketIO(app, async_mode=async_mode, logger=SOCKETIO_DEBUG,
+                    engineio_logger=SOCKETIO_DEBUG, cors_allowed_origins="*",
+                    message_queue=REDIS_URL, json=OrjsonJSON,
+                    ping_interval=25, ping_timeout=60)
 thread = None
 thread_lock = Lock()
+# upper bound on server events coalesced into one frame
+MAX_EVENT_BATCH = 100
+# receive counts per client sid, used when Redis is not configured
+receive_counts = defaultdict(int)
+
+
+def has_clients(namespace='/'):
+    """Return True if any client is connected to namespace on this server."""
+    return bool(socketio.server.manager.rooms.get(namespace))
 
 
 def background_thread():
-    """Example of how to send server generated events to clients."""
+    """Example of how to send server generated events to clients.
+
+    With Redis configured, events pushed as JSON onto the ``server_events``
+    list are forwarded to all clients, so nothing is sent while the system is
+    idle. The list is popped with BLPOP, so each event is taken by exactly one
+    of the server instances and reaches the clients once through the message
+    queue. Events that arrive in a burst are coalesced and sent as a single
+    ``my_response_batch`` frame. Otherwise a heartbeat event is sent once a
+    minute, skipped while no client is connected to this server.
+    """
+    if redis_client is not None:
+        while True:
+            _, data = redis_client.blpop('server_events')
+            batch = []
+            while data is not None:
+                # a malformed event is dropped without stopping the forwarding
+                try:
+                    batch.append(orjson.loads(data))
+                except orjson.JSONDecodeError:
+                    app.logger.warning('Skipping malformed server event: %r',
+                                       data[:200])
+                if len(batch) >= MAX_EVENT_BATCH:
+                    break
+                data = redis_client.lpop('server_events')
+            if not batch:
+                continue
+            if len(batch) == 1:
+                socketio.emit('my_response', batch[0])
+            else:
+                socketio.emit('my_response_batch', batch)
+        return
     count = 0
     while True:
-        socketio.sleep(10)
+        socketio.sleep(60)
+        if not has_clients():
+            continue
         count += 1
         socketio.emit('my_response',
                       {'data': 'Server generated event', 'count': count})
 
 
+def bump_count():
+    """Increment the receive count of the current client and return it."""
+    if redis_client is None:
+        count = receive_counts[request.sid] + 1
+        receive_counts[request.sid] = count
+        return count
+    key = 'sess:' + request.sid
+    pipe = redis_client.pipeline()
+    pipe.hincrby(key, 'receive_count', 1)
+    pipe.expire(key, COUNT_LIFETIME)
+    count, _ = pipe.execute()
+    return count
+
+
 @app.route('/')
 def index():
     return render_template('index.html', async_mode=socketio.async_mode)
@@ -33,93 +122,91 @@ def index():
 
 @socketio.event
 def my_event(message):
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     emit('my_response',
-         {'data': message['data'], 'count': session['receive_count']})
+         {'data': message['data'], 'count': count})
 
 
 @socketio.event
 def my_broadcast_event(message):
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
+    game_room = next((room for room in rooms() if room.startswith('game:')),
+                     None)
     emit('my_response',
-         {'data': message['data'], 'count': session['receive_count']},
-         broadcast=True)
+         {'data': message['data'], 'count': count},
+         to=game_room, broadcast=True)
 
 
 @socketio.event
 def join(message):
     join_room(message['room'])
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     emit('my_response',
          {'data': 'In rooms: ' + ', '.join(rooms()),
-          'count': session['receive_count']})
+          'count': count})
 
 
 @socketio.event
 def leave(message):
     leave_room(message['room'])
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     emit('my_response',
          {'data': 'In rooms: ' + ', '.join(rooms()),
-          'count': session['receive_count']})
+          'count': count})
 
 
 @socketio.on('close_room')
 def on_close_room(message):
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     emit('my_response', {'data': 'Room ' + message['room'] + ' is closing.',
-                         'count': session['receive_count']},
+                         'count': count},
          to=message['room'])
     close_room(message['room'])
 
 
 @socketio.event
 def my_room_event(message):
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     emit('my_response',
-         {'data': message['data'], 'count': session['receive_count']},
+         {'data': message['data'], 'count': count},
          to=message['room'])
 
 
-@socketio.on('*')
-def catch_all(event, data):
-    session['receive_count'] = session.get('receive_count', 0) + 1
-    emit('my_response',
-         {'data': [event, data], 'count': session['receive_count']})
-
-
 @socketio.event
 def disconnect_request():
     @copy_current_request_context
     def can_disconnect():
         disconnect()
 
-    session['receive_count'] = session.get('receive_count', 0) + 1
+    count = bump_count()
     # for this emit we use a callback function
     # when the callback function is invoked we know that the message has been
     # received and it is safe to disconnect
     emit('my_response',
-         {'data': 'Disconnected!', 'count': session['receive_count']},
+         {'data': 'Disconnected!', 'count': count},
          callback=can_disconnect)
 
 
 @socketio.event
-def my_ping():
-    emit('my_pong')
-
-
-@socketio.event
-def connect():
+def connect(auth=None):
     global thread
     with thread_lock:
         if thread is None:
             thread = socketio.start_background_task(background_thread)
+    # clients that belong to a game pass its id in the auth data, so that
+    # broadcasts only reach the other members of that game
+    if auth and auth.get('game'):
+        join_room('game:' + str(auth['game']))
     emit('my_response', {'data': 'Connected', 'count': 0})
 
 
 @socketio.on('disconnect')
 def test_disconnect(reason):
-    print('Client disconnected', request.sid, reason)
+    if redis_client is not None:
+        redis_client.delete('sess:' + request.sid)
+    else:
+        receive_counts.pop(request.sid, None)
+    app.logger.debug('Client disconnected %s %s', request.sid, reason)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,24 @@
-import os, uuid, random, string, datetime, io
+import os, uuid, secrets, string, datetime, time, tempfile, hmac
 from datetime import timedelta, timezone
-from functools import wraps
+from collections import defaultdict
+from functools import wraps, lru_cache
+from itertools import groupby
+from operator import itemgetter
 from flask import (
     Flask, request, redirect, render_template, session as flask_session,
-    url_for, jsonify, g, send_file, has_app_context
+    url_for, jsonify, g, send_file, has_app_context, Response
 )
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.middleware.proxy_fix import ProxyFix
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.constants import SERVER_STATUS
+from pymysql.cursors import Cursor, DictCursor, SSDictCursor
 from contextlib import contextmanager
+from threading import Lock
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -29,6 +37,12 @@ DB_USER = must_get_env("DB_USER")
 DB_PASSWORD = must_get_env("DB_PASSWORD")
 DB_NAME = must_get_env("DB_NAME")
 DB_PORT = int(os.environ.get("DB_PORT", "3306"))
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "25"))
+# Recycle pooled connections before a typical 300s server wait_timeout.
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "280"))
+# Ping connections on checkout; only worth the extra round trip when the
+# server can drop connections early (failover, proxies).
+DB_PREPING = os.environ.get("DB_PREPING", "0") == "1"
 
 app = Flask(
     __name__,
@@ -38,11 +52,32 @@ app = Flask(
 
 app.secret_key = must_get_env("SECRET_KEY")
 
+# Number of reverse proxies in front of the app. Behind a proxy,
+# remote_addr is the proxy's address unless its X-Forwarded-For is trusted,
+# and the admin login limit would then apply to all clients at once.
+TRUSTED_PROXIES = int(os.environ.get("TRUSTED_PROXIES", "0"))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
+
 app.config["SESSION_PERMANENT"] = False
 
 DEBUG_MODE = os.environ.get("FLASK_DEBUG", "0") == "1"
 app.config["TEMPLATES_AUTO_RELOAD"] = DEBUG_MODE
 
+# Compiled templates are kept on disk so new worker processes skip parsing.
+# Without JINJA_CACHE_DIR Jinja uses its own per-user 0700 directory; an
+# explicit directory must be private to this user, since the cached files
+# are loaded as code.
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR")
+if JINJA_CACHE_DIR:
+    os.makedirs(JINJA_CACHE_DIR, mode=0o700, exist_ok=True)
+    _st = os.stat(JINJA_CACHE_DIR)
+    if _st.st_uid != os.getuid() or _st.st_mode & 0o077:
+        raise RuntimeError(f"JINJA_CACHE_DIR {JINJA_CACHE_DIR} must be owned by this user with mode 0700")
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+else:
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 
 # -------------------- Vaccination: Cost types --------------------
 TYPE_COST = {
@@ -54,10 +89,17 @@ TYPE_COST = {
     6: {"B": [64, 48, 32, 16, 0], "A": 32},
 }
 B_COLS = 5
+# Rows of the TypeCostTable export sheet, built once from the constant table.
+TYPE_COST_ROWS = tuple(
+    (t, TYPE_COST[t]["A"], *TYPE_COST[t]["B"][:B_COLS]) for t in sorted(TYPE_COST)
+)
 
+# Costs are pure functions of small integer arguments, so they are memoized.
+@lru_cache(maxsize=4096)
 def a_cost_for(ptype: int) -> float:
     return TYPE_COST.get(ptype, TYPE_COST[1])["A"]
 
+@lru_cache(maxsize=4096)
 def b_cost_adapt(ptype: int, others_A: int, N: int) -> float:
     if ptype not in TYPE_COST:
         ptype = 1
@@ -72,10 +114,18 @@ def b_cost_adapt(ptype: int, others_A: int, N: int) -> float:
     col = max(1, min(B_COLS, col))
     return float(b[col - 1])
 
+@lru_cache(maxsize=256)
+def b_cost_rows(ptype: int, N: int) -> tuple:
+    """B cost for every possible number of others choosing A, as shown on /round."""
+    others_max = max(1, N - 1)
+    return tuple({"others": k, "cost": int(b_cost_adapt(ptype, k, N))}
+                 for k in range(1, others_max + 1))
+
 class MySQLConnectionWrapper:
 
     def __init__(self, conn):
         self._conn = conn
+        self.created_at = time.monotonic()
 
     def execute(self, query, params=None):
 
@@ -83,6 +133,34 @@ class MySQLConnectionWrapper:
         cursor.execute(query, params or ())
         return cursor
 
+    def scalar(self, query, params=None):
+        # First column of the first row, read with a plain tuple cursor so no
+        # dict is built for a single value.
+        cursor = self._conn.cursor(Cursor)
+        try:
+            cursor.execute(query, params or ())
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return row[0] if row else None
+
+    @contextmanager
+    def stream(self, query, params=None):
+        # Unbuffered cursor: rows are read from the server while iterating
+        # instead of being loaded into memory up front. The connection cannot
+        # run other statements until the block exits.
+        cursor = self._conn.cursor(SSDictCursor)
+        try:
+            cursor.execute(query, params or ())
+            yield cursor
+        finally:
+            cursor.close()
+
+    def executemany(self, query, seq_of_params):
+        cursor = self._conn.cursor()
+        cursor.executemany(query, seq_of_params)
+        return cursor
+
     def commit(self):
         return self._conn.commit()
 
@@ -92,6 +170,15 @@ class MySQLConnectionWrapper:
     def close(self):
         return self._conn.close()
 
+    def ping(self):
+        return self._conn.ping(reconnect=True)
+
+    def is_open(self):
+        return bool(self._conn.open)
+
+    def in_transaction(self):
+        return bool(self._conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
+
     def cursor(self):
         return self._conn.cursor()
     
@@ -111,88 +198,257 @@ def _connect_mysql():
         port=DB_PORT,
         cursorclass=DictCursor,
         charset='utf8mb4',
-        autocommit=False,
-        connect_timeout=10,
-        read_timeout=30,
-        write_timeout=30
+        # Reads run without an implicit transaction; multi-statement writes
+        # open one explicitly with begin().
+        autocommit=True,
+        connect_timeout=5,
+        read_timeout=10,
+        write_timeout=30,
+        # Pooled connections are recycled well before the server drops them,
+        # so checkouts skip the ping round trip unless DB_PREPING is set.
+        # TIMESTAMP columns are read and written in UTC.
+        init_command=f"SET SESSION wait_timeout={DB_POOL_RECYCLE * 2}, time_zone='+00:00'"
     )
 
     return MySQLConnectionWrapper(conn)
 # -------------------- DB helpers --------------------
 
 
+# Idle connections, most recently used last. Checking out from the end (LIFO)
+# keeps a small set of hot connections in use and lets the rest age out.
+_pool = []
+_pool_lock = Lock()
+
+def _checkout():
+    while True:
+        with _pool_lock:
+            con = _pool.pop() if _pool else None
+        if con is None:
+            return _connect_mysql()
+        if time.monotonic() - con.created_at > DB_POOL_RECYCLE:
+            _discard(con)
+            continue
+        if DB_PREPING:
+            try:
+                con.ping()
+            except pymysql.MySQLError:
+                _discard(con)
+                continue
+        return con
+
+def _discard(con):
+    try:
+        con.close()
+    except Exception:
+        pass
+
+def _checkin(con, failed=False):
+    # Only connections known to be healthy go back into the pool; one the
+    # server dropped or a request left behind after an error is closed.
+    if failed or not con.is_open():
+        _discard(con)
+        return
+    try:
+        if con.in_transaction():
+            con.rollback()
+    except Exception:
+        _discard(con)
+        return
+    with _pool_lock:
+        if len(_pool) < DB_POOL_SIZE:
+            _pool.append(con)
+            return
+    _discard(con)
+
 def db():
 
+    # Outside of a request (e.g. init_db at startup) use a dedicated,
+    # unpooled connection.
     if not has_app_context():
         return _connect_mysql()
 
     if "db" not in g:
-        g.db = _connect_mysql()
+        g.db = _checkout()
     return g.db
 
 @app.teardown_appcontext
 def close_db(exception=None):
     con = g.pop("db", None)
     if con is not None:
-        try:
-            con.close()
-        except Exception:
-            pass
+        _checkin(con, failed=exception is not None)
 
 
-def ensure_column(con, table, column, definition):
+def ensure_columns(con, table_columns):
+    """Add missing columns, given as {table: [(column, definition), ...]}.
+
+    Existing columns are read with one information_schema query and each
+    table gets at most one multi-clause ALTER.
+    """
+    tables = list(table_columns)
+    placeholders = ",".join(["%s"] * len(tables))
     cursor = con.cursor()
-    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
-    if not cursor.fetchone():
-        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
-        con.commit()
+    cursor.execute(
+        f"""SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME IN ({placeholders})""",
+        tables
+    )
+    have = {(row["TABLE_NAME"], row["COLUMN_NAME"]) for row in cursor.fetchall()}
+    for table, columns in table_columns.items():
+        clauses = [f"ADD COLUMN {name} {definition}"
+                   for name, definition in columns if (table, name) not in have]
+        if clauses:
+            cursor.execute(f"ALTER TABLE {table} " + ", ".join(clauses))
     cursor.close()
 
-def ensure_archive_schema(con, base_table):
-    arch_table = f"archived_{base_table}"
+def ensure_archive_schema(con, base_tables):
+    """Add columns missing from the archived_* copies of the given tables."""
+    tables = list(base_tables) + [f"archived_{t}" for t in base_tables]
+    placeholders = ",".join(["%s"] * len(tables))
     cursor = con.cursor()
 
-    # Get base table columns
-    cursor.execute(f"SHOW COLUMNS FROM {base_table}")
-    base_cols = {row['Field']: row for row in cursor.fetchall()}
-
-    # Get archive table columns
-    cursor.execute(f"SHOW COLUMNS FROM {arch_table}")
-    arch_cols = {row['Field'] for row in cursor.fetchall()}
-
-    # Add missing columns
-    for name, col_info in base_cols.items():
-        if name not in arch_cols:
-            col_type = col_info['Type']
-            default = col_info['Default']
-            null = "NULL" if col_info['Null'] == 'YES' else "NOT NULL"
-
-            if default is not None:
-                cursor.execute(f"ALTER TABLE {arch_table} ADD COLUMN {name} {col_type} {null} DEFAULT {default}")
-            else:
-                cursor.execute(f"ALTER TABLE {arch_table} ADD COLUMN {name} {col_type} {null}")
+    # Columns of all base and archive tables in one round trip
+    cursor.execute(
+        f"""SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME IN ({placeholders})
+            ORDER BY TABLE_NAME, ORDINAL_POSITION""",
+        tables
+    )
+    columns = defaultdict(dict)
+    for row in cursor.fetchall():
+        columns[row['TABLE_NAME']][row['COLUMN_NAME']] = row
+
+    # Add missing columns, one ALTER per archive table
+    for base_table in base_tables:
+        arch_table = f"archived_{base_table}"
+        clauses = []
+        for name, col_info in columns[base_table].items():
+            if name not in columns[arch_table]:
+                col_type = col_info['COLUMN_TYPE']
+                default = col_info['COLUMN_DEFAULT']
+                null = "NULL" if col_info['IS_NULLABLE'] == 'YES' else "NOT NULL"
+
+                if default is not None:
+                    clauses.append(f"ADD COLUMN {name} {col_type} {null} DEFAULT {default}")
+                else:
+                    clauses.append(f"ADD COLUMN {name} {col_type} {null}")
+        if clauses:
+            cursor.execute(f"ALTER TABLE {arch_table} " + ", ".join(clauses))
 
     con.commit()
     cursor.close()
 
 # ---------- UTC helpers (aware) ----------
 def utc_now():
-    return datetime.datetime.now(timezone.utc).replace(microsecond=0)
+    return datetime.datetime.fromtimestamp(int(time.time()), timezone.utc)
 
 def iso_utc(dt: datetime.datetime) -> str:
-    return dt.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace("+00:00", "Z")
+    if dt.tzinfo is not timezone.utc:
+        dt = dt.astimezone(timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def db_now() -> str:
+    # created_at is written explicitly rather than left to the column
+    # default: until init_db has migrated it, the column is still a VARCHAR
+    # without one. This format is valid for both column types.
+    return utc_now().strftime("%Y-%m-%d %H:%M:%S")
 
 def parse_iso_utc(s: str) -> datetime.datetime:
     return datetime.datetime.fromisoformat((s or "").replace("Z", "+00:00"))
 
+def created_iso(value) -> str:
+    # A migrated TIMESTAMP created_at comes back as a naive UTC datetime.
+    if isinstance(value, datetime.datetime):
+        return value.isoformat() + "Z"
+    return value
+
+
+# -------------------- Queries --------------------
+# Statements used on the per-request hot paths, shared instead of repeated
+# inline at every call site.
+SQL_SELECT_1 = "SELECT 1"
+SQL_PARTICIPANT_BY_ID = "SELECT * FROM participants WHERE id=%s"
+SQL_SESSION_BY_ID = "SELECT * FROM sessions WHERE id=%s"
+SQL_PARTICIPANT_BY_CODE = "SELECT * FROM participants WHERE code=%s"
+SQL_SESSION_POLL = (
+    "SELECT s.*, (SELECT joined FROM participants WHERE id=%s) AS participant_joined "
+    "FROM sessions s WHERE s.id=%s"
+)
+SQL_LOCK_SESSION = "SELECT id FROM sessions WHERE id=%s FOR UPDATE"
+SQL_CLAIM_SESSION = "SELECT id FROM sessions WHERE id=%s FOR UPDATE SKIP LOCKED"
+SQL_COUNT_JOINED = "SELECT COUNT(*) FROM participants WHERE session_id=%s AND joined=1"
+SQL_COUNT_DECISIONS = "SELECT COUNT(*) FROM decisions WHERE session_id=%s AND round_number=%s"
+SQL_COUNT_UNSETTLED = (
+    "SELECT COUNT(*) FROM decisions "
+    "WHERE session_id=%s AND round_number=%s AND total_cost IS NULL"
+)
+SQL_ROUND_DECISIONS = (
+    "SELECT d.id, d.participant_id, d.choice, p.ptype, p.join_number "
+    "FROM decisions d JOIN participants p ON p.id=d.participant_id "
+    "WHERE d.session_id=%s AND d.round_number=%s ORDER BY p.join_number"
+)
+SQL_CHOICE_COUNTS = (
+    "SELECT COALESCE(SUM(choice='A'), 0) AS a, COALESCE(SUM(choice='B'), 0) AS b "
+    "FROM decisions WHERE session_id=%s AND round_number=%s"
+)
+SQL_OWN_DECISION = (
+    "SELECT choice, total_cost, payout, base_payout, b_cost_round, others_A "
+    "FROM decisions WHERE session_id=%s AND participant_id=%s AND round_number=%s"
+)
+SQL_DELETE_DECISIONS = "DELETE FROM decisions WHERE session_id=%s"
+SQL_DELETE_ROUND_PHASES = "DELETE FROM round_phases WHERE session_id=%s"
+SQL_PARTICIPANT_PROGRESS = (
+    "SELECT (SELECT COUNT(*) FROM participants WHERE session_id=%s AND ready_for_next=1) AS ready, "
+    "EXISTS(SELECT 1 FROM decisions WHERE participant_id=%s AND round_number=%s) AS decided, "
+    "EXISTS(SELECT 1 FROM round_phases WHERE session_id=%s AND round_number=%s) AS phase"
+)
+SQL_ROUND_PHASE = (
+    "SELECT decision_ends_at, watch_ends_at FROM round_phases "
+    "WHERE session_id=%s AND round_number=%s"
+)
+SQL_ROUND_RESULTS = (
+    "SELECT p.join_number, d.choice, d.total_cost, d.payout "
+    "FROM decisions d JOIN participants p ON p.id=d.participant_id "
+    "WHERE d.session_id=%s AND d.round_number=%s ORDER BY p.join_number"
+)
+SQL_DECIDED_PLAYERS = (
+    "SELECT p.join_number FROM decisions d JOIN participants p ON p.id=d.participant_id "
+    "WHERE d.session_id=%s AND d.round_number=%s ORDER BY p.join_number"
+)
+SQL_INSERT_DECISION = (
+    "INSERT INTO decisions (session_id, participant_id, round_number, choice, created_at) "
+    "VALUES (%s,%s,%s,%s,%s) ON DUPLICATE KEY UPDATE id=id"
+)
+SQL_REPLACE_ROUND_PHASE = (
+    "REPLACE INTO round_phases "
+    "(session_id, round_number, decision_ends_at, watch_ends_at, created_at) "
+    "VALUES (%s,%s,%s,%s,%s)"
+)
+SQL_MARK_REVEALED = (
+    "UPDATE decisions SET reveal=1 "
+    "WHERE session_id=%s AND round_number=%s AND (reveal IS NULL OR reveal!=1)"
+)
+SQL_REVEAL_PLAYERS = (
+    "SELECT p.id AS pid, p.code, p.join_number, d.choice, d.payout "
+    "FROM participants p "
+    "LEFT JOIN decisions d ON d.participant_id=p.id AND d.round_number=%s "
+    "WHERE p.session_id=%s ORDER BY p.join_number, p.code"
+)
+SQL_SET_READY = (
+    "UPDATE participants SET ready_for_next=1 "
+    "WHERE id=%s AND (ready_for_next IS NULL OR ready_for_next!=1)"
+)
+SQL_READY_PLAYERS = (
+    "SELECT id, join_number, ready_for_next FROM participants "
+    "WHERE session_id=%s ORDER BY join_number"
+)
 
-def init_db():
-    con = db()
-    cursor = con.cursor()
 
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS sessions (
-        id VARCHAR(36) PRIMARY KEY,
+# Table name -> DDL, in creation order. UUIDs are stored as CHAR(36) ASCII:
+# fixed width and 36 bytes per index key instead of up to 144 in utf8mb4.
+TABLE_DDL = {
+    "sessions": """CREATE TABLE IF NOT EXISTS sessions (
+        id CHAR(36) CHARACTER SET ascii PRIMARY KEY,
         name VARCHAR(255),
         group_size INT,
         rounds INT,
@@ -203,18 +459,16 @@ def init_db():
         subsidy_amount DECIMAL(10,2) DEFAULT 0,
         regime VARCHAR(50),
         starting_balance DECIMAL(10,2) DEFAULT 500,
-        created_at VARCHAR(30),
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
         archived TINYINT DEFAULT 0,
         reveal_window INT DEFAULT 5,
         watch_time INT DEFAULT 15,
-        cost_mode VARCHAR(50) DEFAULT 'type_table'
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
-    )
-
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS participants (
-        id VARCHAR(36) PRIMARY KEY,
-        session_id VARCHAR(36),
+        cost_mode VARCHAR(50) DEFAULT 'type_table',
+        INDEX idx_created (created_at)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "participants": """CREATE TABLE IF NOT EXISTS participants (
+        id CHAR(36) CHARACTER SET ascii PRIMARY KEY,
+        session_id CHAR(36) CHARACTER SET ascii,
         code VARCHAR(10) UNIQUE,
         theta DECIMAL(10,2),
         lambda DECIMAL(10,2),
@@ -223,105 +477,221 @@ def init_db():
         current_round INT DEFAULT 1,
         balance DECIMAL(10,2) DEFAULT 0,
         completed TINYINT DEFAULT 0,
-        created_at VARCHAR(30),
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
         ptype INT,
         ready_for_next TINYINT DEFAULT 0,
-        INDEX idx_session (session_id),
-        INDEX idx_session_code (session_id, code)
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
-    )
-
-    cursor.execute(
-        """CREATE TABLE IF NOT EXISTS decisions (
+        INDEX idx_session_joined (session_id, joined, join_number),
+        INDEX idx_session_code (session_id, code),
+        CONSTRAINT fk_participants_session FOREIGN KEY (session_id)
+            REFERENCES sessions(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "decisions": """CREATE TABLE IF NOT EXISTS decisions (
         id INT PRIMARY KEY AUTO_INCREMENT,
-        session_id VARCHAR(36),
-        participant_id VARCHAR(36),
+        session_id CHAR(36) CHARACTER SET ascii,
+        participant_id CHAR(36) CHARACTER SET ascii,
         round_number INT,
         choice VARCHAR(1),
         a_cost DECIMAL(10,2),
         b_cost DECIMAL(10,2),
         total_cost DECIMAL(10,2),
-        created_at VARCHAR(30),
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
         reveal TINYINT,
         payout DECIMAL(10,2),
         others_A INT,
         b_cost_round DECIMAL(10,2),
         base_payout DECIMAL(10,2),
-        INDEX idx_session_round (session_id, round_number),
+        INDEX idx_session_round_choice (session_id, round_number, participant_id, choice),
         INDEX idx_participant_round (participant_id, round_number),
-        UNIQUE KEY ux_participant_round (participant_id, round_number)
-    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"""
+        UNIQUE KEY ux_participant_round (participant_id, round_number),
+        CONSTRAINT fk_decisions_session FOREIGN KEY (session_id)
+            REFERENCES sessions(id) ON DELETE CASCADE,
+        CONSTRAINT fk_decisions_participant FOREIGN KEY (participant_id)
+            REFERENCES participants(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "round_phases": """CREATE TABLE IF NOT EXISTS round_phases (
+        session_id CHAR(36) CHARACTER SET ascii,
+        round_number INT,
+        decision_ends_at VARCHAR(30),
+        watch_ends_at VARCHAR(30),
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (session_id, round_number),
+        CONSTRAINT fk_round_phases_session FOREIGN KEY (session_id)
+            REFERENCES sessions(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "archived_sessions": """CREATE TABLE IF NOT EXISTS archived_sessions (
+        id CHAR(36) CHARACTER SET ascii PRIMARY KEY,
+        name VARCHAR(255),
+        group_size INT,
+        rounds INT,
+        cvac DECIMAL(10,2),
+        alpha DECIMAL(10,2),
+        cinf DECIMAL(10,2),
+        subsidy TINYINT DEFAULT 0,
+        subsidy_amount DECIMAL(10,2) DEFAULT 0,
+        regime VARCHAR(50),
+        starting_balance DECIMAL(10,2) DEFAULT 500,
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        archived TINYINT DEFAULT 0,
+        reveal_window INT DEFAULT 5,
+        watch_time INT DEFAULT 15,
+        cost_mode VARCHAR(50) DEFAULT 'type_table'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "archived_participants": """CREATE TABLE IF NOT EXISTS archived_participants (
+        id CHAR(36) CHARACTER SET ascii PRIMARY KEY,
+        session_id CHAR(36) CHARACTER SET ascii,
+        code VARCHAR(10),
+        theta DECIMAL(10,2),
+        lambda DECIMAL(10,2),
+        joined TINYINT DEFAULT 0,
+        join_number INT,
+        current_round INT DEFAULT 1,
+        balance DECIMAL(10,2) DEFAULT 0,
+        completed TINYINT DEFAULT 0,
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        ptype INT,
+        ready_for_next TINYINT DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    "archived_decisions": """CREATE TABLE IF NOT EXISTS archived_decisions (
+        id INT PRIMARY KEY,
+        session_id CHAR(36) CHARACTER SET ascii,
+        participant_id CHAR(36) CHARACTER SET ascii,
+        round_number INT,
+        choice VARCHAR(1),
+        a_cost DECIMAL(10,2),
+        b_cost DECIMAL(10,2),
+        total_cost DECIMAL(10,2),
+        created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP,
+        reveal TINYINT,
+        payout DECIMAL(10,2),
+        others_A INT,
+        b_cost_round DECIMAL(10,2),
+        base_payout DECIMAL(10,2)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+}
+
+# Columns added to the live tables after their first release. Databases
+# created before them get the columns added by init_db.
+LATE_COLUMNS = {
+    "sessions": [
+        ("reveal_window", "INT DEFAULT 5"),
+        ("watch_time", "INT DEFAULT 15"),
+        ("cost_mode", "VARCHAR(50) DEFAULT 'type_table'"),
+    ],
+    "participants": [
+        ("ptype", "INT"),
+        ("ready_for_next", "TINYINT DEFAULT 0"),
+    ],
+    "decisions": [
+        ("reveal", "TINYINT"),
+        ("payout", "DECIMAL(10,2)"),
+        ("others_A", "INT"),
+        ("b_cost_round", "DECIMAL(10,2)"),
+        ("base_payout", "DECIMAL(10,2)"),
+    ],
+}
+
+# Joined counts and the next join number are answered from the
+# (session_id, joined, join_number) index alone, and a round's choices from
+# (session_id, round_number, participant_id, choice); each covers every lookup
+# the index it replaces served. Dashboard listings walk sessions by creation
+# time.
+LATE_INDEXES = [
+    ("participants", "idx_session_joined", "session_id, joined, join_number"),
+    ("decisions", "idx_session_round_choice", "session_id, round_number, participant_id, choice"),
+    ("sessions", "idx_created", "created_at"),
+]
+DROPPED_INDEXES = [
+    ("participants", "idx_session"),
+    ("decisions", "idx_session_round"),
+]
+
+# Foreign keys of the live tables as (name, table, column, parent, parent
+# column). Deleting a session cascades to all of its rows.
+FOREIGN_KEYS = [
+    ("fk_participants_session", "participants", "session_id", "sessions", "id"),
+    ("fk_decisions_session", "decisions", "session_id", "sessions", "id"),
+    ("fk_decisions_participant", "decisions", "participant_id", "participants", "id"),
+    ("fk_round_phases_session", "round_phases", "session_id", "sessions", "id"),
+]
+
+
+def init_db():
+    con = db()
+    cursor = con.cursor()
+
+    # Only tables that are missing are created, so repeated calls cost a
+    # single SHOW TABLES round trip.
+    cursor.execute("SHOW TABLES")
+    existing = {next(iter(row.values())) for row in cursor.fetchall()}
+    for table, ddl in TABLE_DDL.items():
+        if table not in existing:
+            cursor.execute(ddl)
+    ensure_columns(con, LATE_COLUMNS)
+
+    # Indexes added after the first release, and the ones they supersede.
+    # New indexes are created before old ones are dropped, so foreign keys
+    # always keep an index on their column.
+    cursor.execute(
+        """SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+           WHERE TABLE_SCHEMA=DATABASE()"""
+    )
+    indexes = {(row["TABLE_NAME"], row["INDEX_NAME"]) for row in cursor.fetchall()}
+    for table, name, columns in LATE_INDEXES:
+        if (table, name) not in indexes:
+            cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    for table, name in DROPPED_INDEXES:
+        if (table, name) in indexes:
+            cursor.execute(f"DROP INDEX {name} ON {table}")
+
+    # Tables created before UUID columns were switched to fixed-width ASCII
+    # get their id columns converted once.
+    cursor.execute(
+        """SELECT TABLE_NAME, COLUMN_NAME, COLUMN_KEY FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA=DATABASE() AND COLUMN_NAME IN ('id','session_id','participant_id')
+             AND DATA_TYPE='varchar' AND CHARACTER_MAXIMUM_LENGTH=36"""
+    )
+    for row in cursor.fetchall():
+        null = "NOT NULL" if row["COLUMN_KEY"] == "PRI" else "NULL"
+        cursor.execute(
+            f"ALTER TABLE {row['TABLE_NAME']} MODIFY {row['COLUMN_NAME']} CHAR(36) CHARACTER SET ascii {null}"
+        )
+
+    # created_at used to hold app-formatted ISO strings; rewrite them into
+    # MySQL's datetime format and switch the column to a server default.
+    cursor.execute(
+        """SELECT TABLE_NAME FROM information_schema.COLUMNS
+           WHERE TABLE_SCHEMA=DATABASE() AND COLUMN_NAME='created_at' AND DATA_TYPE='varchar'"""
     )
+    for row in cursor.fetchall():
+        table = row["TABLE_NAME"]
+        cursor.execute(
+            f"UPDATE {table} SET created_at=NULLIF(REPLACE(REPLACE(created_at,'T',' '),'Z',''),'')"
+        )
+        cursor.execute(f"ALTER TABLE {table} MODIFY created_at TIMESTAMP(0) DEFAULT CURRENT_TIMESTAMP")
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS round_phases (
-            session_id VARCHAR(36),
-            round_number INT,
-            decision_ends_at VARCHAR(30),
-            watch_ends_at VARCHAR(30),
-            created_at VARCHAR(30),
-            PRIMARY KEY (session_id, round_number)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
-
-    # Create archived tables with same structure
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS archived_sessions (
-            id VARCHAR(36) PRIMARY KEY,
-            name VARCHAR(255),
-            group_size INT,
-            rounds INT,
-            cvac DECIMAL(10,2),
-            alpha DECIMAL(10,2),
-            cinf DECIMAL(10,2),
-            subsidy TINYINT DEFAULT 0,
-            subsidy_amount DECIMAL(10,2) DEFAULT 0,
-            regime VARCHAR(50),
-            starting_balance DECIMAL(10,2) DEFAULT 500,
-            created_at VARCHAR(30),
-            archived TINYINT DEFAULT 0,
-            reveal_window INT DEFAULT 5,
-            watch_time INT DEFAULT 15,
-            cost_mode VARCHAR(50) DEFAULT 'type_table'
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS archived_participants (
-            id VARCHAR(36) PRIMARY KEY,
-            session_id VARCHAR(36),
-            code VARCHAR(10),
-            theta DECIMAL(10,2),
-            lambda DECIMAL(10,2),
-            joined TINYINT DEFAULT 0,
-            join_number INT,
-            current_round INT DEFAULT 1,
-            balance DECIMAL(10,2) DEFAULT 0,
-            completed TINYINT DEFAULT 0,
-            created_at VARCHAR(30),
-            ptype INT,
-            ready_for_next TINYINT DEFAULT 0
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS archived_decisions (
-            id INT PRIMARY KEY,
-            session_id VARCHAR(36),
-            participant_id VARCHAR(36),
-            round_number INT,
-            choice VARCHAR(1),
-            a_cost DECIMAL(10,2),
-            b_cost DECIMAL(10,2),
-            total_cost DECIMAL(10,2),
-            created_at VARCHAR(30),
-            reveal TINYINT,
-            payout DECIMAL(10,2),
-            others_A INT,
-            b_cost_round DECIMAL(10,2),
-            base_payout DECIMAL(10,2)
-        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
-    """)
+    # Tables created before the foreign keys existed get them added. Rows
+    # whose parent is already gone (left over from an interrupted delete)
+    # would block the constraint and are unreachable anyway, so they go.
+    cursor.execute(
+        """SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS
+           WHERE CONSTRAINT_SCHEMA=DATABASE()"""
+    )
+    fks = {row["CONSTRAINT_NAME"] for row in cursor.fetchall()}
+    for name, table, column, parent, parent_column in FOREIGN_KEYS:
+        if name in fks:
+            continue
+        cursor.execute(
+            f"""DELETE c FROM {table} c LEFT JOIN {parent} p ON p.{parent_column}=c.{column}
+                WHERE p.{parent_column} IS NULL AND c.{column} IS NOT NULL"""
+        )
+        if cursor.rowcount:
+            app.logger.warning(
+                "Deleted %d orphaned %s rows before adding %s", cursor.rowcount, table, name
+            )
+        cursor.execute(
+            f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+            f"REFERENCES {parent}({parent_column}) ON DELETE CASCADE"
+        )
 
     con.commit()
     cursor.close()
@@ -335,11 +705,95 @@ def load_participant():
     g.participant = None
     if pid:
         con = db()
-        g.participant = con.execute("SELECT * FROM participants WHERE id=%s", (pid,)).fetchone()
+        g.participant = con.execute(SQL_PARTICIPANT_BY_ID, (pid,)).fetchone()
+
+# Participant code alphabet without the easily confused O/0 and I/1. Codes
+# are the only credential participants have, so they come from secrets.
+_CODE_ALPHABET = "".join(c for c in string.ascii_uppercase + string.digits if c not in "O0I1")
 
 def create_code(n=6):
-    chars = (string.ascii_uppercase + string.digits).replace("O","").replace("0","").replace("I","").replace("1","")
-    return "".join(random.choice(chars) for _ in range(n))
+    return "".join(secrets.choice(_CODE_ALPHABET) for _ in range(n))
+
+
+def unused_codes(con, n: int) -> list:
+    """Generate n distinct codes not yet in use, checked with one query per batch."""
+    if n <= 0:
+        return []
+    codes = set()
+    while True:
+        while len(codes) < n:
+            codes.add(create_code(6))
+        placeholders = ",".join(["%s"] * len(codes))
+        taken = {row["code"] for row in con.execute(
+            f"SELECT code FROM participants WHERE code IN ({placeholders})", list(codes)
+        ).fetchall()}
+        if not taken:
+            return list(codes)
+        codes -= taken
+
+def bulk_create_participants(con, sid: str, n: int, balance) -> None:
+    """Insert n participants for a session with one multi-row INSERT."""
+    rows = []
+    created_at = db_now()
+    for i, code in enumerate(unused_codes(con, n)):
+        rows.append((str(uuid.uuid4()), sid, code, 0.0, 0.0, 0, None, 1, balance, 0, created_at, (i % 6) + 1))
+    con.executemany(
+        "INSERT INTO participants (id,session_id,code,theta,lambda,joined,join_number,current_round,balance,completed,created_at,ptype) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
+        rows
+    )
+
+
+# -------------------- Joined counts --------------------
+# Lobby pages poll the joined count of their session. Counts are cached per
+# process for a short time so that concurrent pollers share one COUNT(*);
+# joins and resets handled by this process drop the entry immediately.
+# The per-process caches below only ever get, set or pop a single key, which
+# is atomic in CPython, so the polling paths take no lock.
+JOINED_COUNT_TTL = 1.0
+_joined_counts = {}
+
+def joined_count(con, sid: str) -> int:
+    now = time.monotonic()
+    hit = _joined_counts.get(sid)
+    if hit and now - hit[0] < JOINED_COUNT_TTL:
+        return hit[1]
+    count = con.scalar(SQL_COUNT_JOINED, (sid,))
+    _joined_counts[sid] = (now, count)
+    return count
+
+def forget_joined_count(sid: str) -> None:
+    _joined_counts.pop(sid, None)
+
+
+def poll_session(con, sid: str, pid):
+    """Load the polled session and tell whether the polling participant was
+    reset, in one round-trip. Returns (session row or None, reset flag)."""
+    s = con.execute(SQL_SESSION_POLL, (pid, sid)).fetchone()
+    if not s:
+        return None, False
+    # NULL when no participant id was sent or it is unknown.
+    return s, s["participant_joined"] is not None and not s["participant_joined"]
+
+
+# -------------------- Admin status --------------------
+# The admin session page polls a status payload that only changes when a
+# participant decides, gets ready or a round is finalized. Payloads are
+# cached per session for half a second so several admin tabs share one build;
+# those state changes drop the entry.
+ADMIN_STATUS_TTL = 0.5
+_admin_status = {}
+
+def cached_admin_status(sid: str):
+    hit = _admin_status.get(sid)
+    if hit and time.monotonic() - hit[0] < ADMIN_STATUS_TTL:
+        return hit[1]
+    return None
+
+def store_admin_status(sid: str, payload: dict) -> None:
+    _admin_status[sid] = (time.monotonic(), payload)
+
+def forget_admin_status(sid: str) -> None:
+    _admin_status.pop(sid, None)
 
 
 # -------------------- State & Guard --------------------
@@ -347,44 +801,24 @@ def current_state(con, p, s) -> str:
     if not p or not s: return "lobby"
     if s["archived"]: return "done"
 
-    joined = con.execute(
-        "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND joined=1", (s["id"],)
-    ).fetchone()["c"]
+    joined = joined_count(con, s["id"])
     if joined < s["group_size"]:
         return "lobby"
 
     r = p["current_round"]
 
-    if r > s["rounds"]:
-        all_ready = con.execute(
-            "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND ready_for_next=1",
-            (s["id"],)
-        ).fetchone()["c"] >= s["group_size"]
-
-        if all_ready:
-            return "done"
-        else:
-            return "reveal"
-
-    if r > 1:
-        all_ready = con.execute(
-            "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND ready_for_next=1",
-            (s["id"],)
-        ).fetchone()["c"] >= s["group_size"]
+    # Everything the remaining decisions depend on, in one round trip.
+    row = con.execute(SQL_PARTICIPANT_PROGRESS, (s["id"], p["id"], r, s["id"], r)).fetchone()
+    all_ready = row["ready"] >= s["group_size"]
 
-        if not all_ready:
-            return "reveal"
+    if r > s["rounds"]:
+        return "done" if all_ready else "reveal"
 
-    decided = con.execute(
-        "SELECT 1 FROM decisions WHERE participant_id=%s AND round_number=%s", (p["id"], r)
-    ).fetchone()
-    if not decided: return "round"
+    if r > 1 and not all_ready:
+        return "reveal"
 
-    ph = con.execute(
-        "SELECT watch_ends_at FROM round_phases WHERE session_id=%s AND round_number=%s",
-        (s["id"], r)
-    ).fetchone()
-    if not ph: return "wait"
+    if not row["decided"]: return "round"
+    if not row["phase"]: return "wait"
 
     return "reveal"
 
@@ -403,9 +837,11 @@ def guard(expect_state: str):
         @wraps(fn)
         def inner(*args, **kwargs):
             if not g.participant: return redirect(url_for("join"))
+            # The participant was loaded for this request already; the
+            # session is kept on g for the view.
             con = db()
-            p = con.execute("SELECT * FROM participants WHERE id=%s", (g.participant["id"],)).fetchone()
-            s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+            p = g.participant
+            s = g.session = con.execute(SQL_SESSION_BY_ID, (p["session_id"],)).fetchone()
             st = current_state(con, p, s)
             if st != expect_state: return redirect(state_to_url(st))
             return fn(*args, **kwargs)
@@ -414,48 +850,61 @@ def guard(expect_state: str):
 
 
 # -------------------- Round finalization (atomic) --------------------
+# SKIP LOCKED needs MySQL 8.0 or MariaDB 10.6. Older servers fall back to a
+# plain FOR UPDATE: concurrent finalizers then wait for the lock and stop at
+# the missing-count check. Detected once per process on first use.
+_claim_session_sql = None
+
+def supports_skip_locked(version: str) -> bool:
+    major, minor = (int(x) for x in version.split("-")[0].split(".")[:2])
+    if "mariadb" in version.lower():
+        return (major, minor) >= (10, 6)
+    return (major, minor) >= (8, 0)
+
+def claim_session_sql(con) -> str:
+    global _claim_session_sql
+    if _claim_session_sql is None:
+        version = con.scalar("SELECT VERSION()")
+        _claim_session_sql = SQL_CLAIM_SESSION if supports_skip_locked(version) else SQL_LOCK_SESSION
+    return _claim_session_sql
+
 def _finalize_round_atomic(con, sid: str, r: int, s: dict):
     cursor = con.cursor()
 
     try:
         con.begin()
 
-        cursor.execute(
-            "SELECT COUNT(*) as c FROM decisions WHERE session_id=%s AND round_number=%s",
-            (sid, r)
-        )
-        decided = cursor.fetchone()["c"]
+        # Concurrent /round_status polls all try to finalize; whoever holds
+        # the session row does the work and, with SKIP LOCKED, the others
+        # return at once instead of waiting and recomputing the round.
+        if con.execute(claim_session_sql(con), (sid,)).fetchone() is None:
+            con.rollback()
+            return
+
+        decided = con.scalar(SQL_COUNT_DECISIONS, (sid, r))
 
         if decided < s["group_size"]:
             con.rollback()
             return
 
-        cursor.execute(
-            "SELECT COUNT(*) as c FROM decisions WHERE session_id=%s AND round_number=%s AND total_cost IS NULL",
-            (sid, r)
-        )
-        missing = cursor.fetchone()["c"]
+        missing = con.scalar(SQL_COUNT_UNSETTLED, (sid, r))
 
         if missing <= 0:
             con.rollback()
             return
 
-        cursor.execute(
-            """SELECT d.id, d.participant_id, d.choice, p.ptype, p.join_number
-               FROM decisions d JOIN participants p ON p.id=d.participant_id
-               WHERE d.session_id=%s AND d.round_number=%s
-               ORDER BY p.join_number""",
-            (sid, r)
-        )
+        cursor.execute(SQL_ROUND_DECISIONS, (sid, r))
         rows = cursor.fetchall()
 
         total_A = sum(1 for row in rows if row["choice"] == "A")
         N = s["group_size"]
         M = float(s["starting_balance"] or 500)
 
+        # Costs are computed in Python and written back with one multi-table
+        # UPDATE joined against the per-decision values, which also carries
+        # the payout over to the participant's balance.
+        values = []
         for row in rows:
-            did = row["id"]
-            pid = row["participant_id"]
             choice = row["choice"]
             ptype = row["ptype"] or 1
 
@@ -469,25 +918,30 @@ def _finalize_round_atomic(con, sid: str, r: int, s: dict):
                 b_cost_round = cost
 
             payout = max(M - float(cost), 0)
-
-            cursor.execute(
-                """UPDATE decisions
-                   SET a_cost=%s, b_cost=%s, total_cost=%s,
-                       payout=%s, base_payout=%s, others_A=%s, b_cost_round=%s, reveal=1
-                   WHERE id=%s AND total_cost IS NULL""",
-                (
-                    cost if choice == "A" else None,
-                    cost if choice == "B" else None,
-                    cost,
-                    payout,
-                    M,
-                    others_A,
-                    b_cost_round,
-                    did
-                )
-            )
-
-            cursor.execute("UPDATE participants SET balance=%s WHERE id=%s", (payout, pid))
+            values.extend((
+                row["id"],
+                cost if choice == "A" else None,
+                cost if choice == "B" else None,
+                cost,
+                payout,
+                others_A,
+                b_cost_round,
+            ))
+
+        derived = " UNION ALL ".join(
+            ["SELECT %s AS id, %s AS a_cost, %s AS b_cost, %s AS total_cost, "
+             "%s AS payout, %s AS others_A, %s AS b_cost_round"]
+            + ["SELECT %s,%s,%s,%s,%s,%s,%s"] * (len(rows) - 1)
+        )
+        cursor.execute(
+            f"""UPDATE decisions d JOIN ({derived}) v ON v.id=d.id
+                JOIN participants p ON p.id=d.participant_id
+                SET d.a_cost=v.a_cost, d.b_cost=v.b_cost, d.total_cost=v.total_cost,
+                    d.payout=v.payout, d.base_payout=%s, d.others_A=v.others_A,
+                    d.b_cost_round=v.b_cost_round, d.reveal=1, p.balance=v.payout
+                WHERE d.total_cost IS NULL""",
+            (*values, M)
+        )
 
         cursor.execute(
             "UPDATE participants SET current_round = current_round + 1, ready_for_next = 0 WHERE session_id=%s AND current_round=%s",
@@ -497,13 +951,12 @@ def _finalize_round_atomic(con, sid: str, r: int, s: dict):
         now = utc_now()
         sec = int(s["watch_time"] or s["reveal_window"] or 5)
         cursor.execute(
-            """REPLACE INTO round_phases
-               (session_id,round_number,decision_ends_at,watch_ends_at,created_at)
-               VALUES (%s,%s,%s,%s,%s)""",
-            (sid, r, iso_utc(now), iso_utc(now + timedelta(seconds=sec)), iso_utc(now))
+            SQL_REPLACE_ROUND_PHASE,
+            (sid, r, iso_utc(now), iso_utc(now + timedelta(seconds=sec)), db_now())
         )
 
         con.commit()
+        forget_admin_status(sid)
 
     except Exception:
         try:
@@ -520,8 +973,8 @@ def _finalize_round_atomic(con, sid: str, r: int, s: dict):
 def index():
     if g.participant:
         con = db()
-        p = con.execute("SELECT * FROM participants WHERE id=%s", (g.participant["id"],)).fetchone()
-        s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+        p = con.execute(SQL_PARTICIPANT_BY_ID, (g.participant["id"],)).fetchone()
+        s = con.execute(SQL_SESSION_BY_ID, (p["session_id"],)).fetchone()
         return redirect(state_to_url(current_state(con, p, s)))
     return redirect(url_for("join"))
 
@@ -535,36 +988,44 @@ def join():
     con = db()
     if request.method == "POST":
         code = request.form.get("code", "").strip().upper()
-        p = con.execute("SELECT * FROM participants WHERE code=%s", (code,)).fetchone()
+        p = con.execute(SQL_PARTICIPANT_BY_CODE, (code,)).fetchone()
         if not p:
             return render_template("join.html", error="Code unbekannt.")
         if p["completed"]:
             return render_template("join.html", error="Dieser Code wurde bereits abgeschlossen. Bitte neuen Code verwenden.")
-        now = iso_utc(utc_now())
+        con.begin()
         if not p["joined"]:
-            nxt = con.execute(
-                "SELECT COALESCE(MAX(join_number),0)+1 AS n FROM participants WHERE session_id=%s AND joined=1",
-                (p["session_id"],)
-            ).fetchone()["n"]
-            ptype = p["ptype"] or ((nxt-1) % 6) + 1
+            # Locking the session row serializes concurrent joins, so the next
+            # join number is computed and assigned in a single UPDATE without
+            # two participants ending up with the same number. joined=0 makes
+            # a double submit of the same code a no-op.
+            con.execute(SQL_LOCK_SESSION, (p["session_id"],))
             con.execute(
-                "UPDATE participants SET joined=1, join_number=%s, ptype=%s, created_at=COALESCE(created_at, %s) WHERE id=%s",
-                (nxt, ptype, now, p["id"])
+                """UPDATE participants
+                   SET joined=1,
+                       join_number=(SELECT n FROM (
+                           SELECT COALESCE(MAX(join_number),0)+1 AS n FROM participants
+                           WHERE session_id=%s AND joined=1) t),
+                       ptype=COALESCE(ptype, MOD(join_number-1, 6)+1)
+                   WHERE id=%s AND joined=0""",
+                (p["session_id"], p["id"])
             )
         else:
             if not p["ptype"]:
-                cnt = con.execute(
-                    "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND ptype IS NOT NULL",
+                cnt = con.scalar(
+                    "SELECT COUNT(*) FROM participants WHERE session_id=%s AND ptype IS NOT NULL",
                     (p["session_id"],)
-                ).fetchone()["c"]
+                )
                 ptype = (cnt % 6) + 1
                 con.execute("UPDATE participants SET ptype=%s WHERE id=%s", (ptype, p["id"]))
             con.execute("UPDATE participants SET joined=1 WHERE id=%s", (p["id"],))
         flask_session["participant_id"] = p["id"]
         flask_session.permanent = False
         con.commit()
-        p2 = con.execute("SELECT * FROM participants WHERE id=%s", (p["id"],)).fetchone()
-        s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+        forget_joined_count(p["session_id"])
+        forget_admin_status(p["session_id"])
+        p2 = con.execute(SQL_PARTICIPANT_BY_ID, (p["id"],)).fetchone()
+        s = con.execute(SQL_SESSION_BY_ID, (p["session_id"],)).fetchone()
         return redirect(state_to_url(current_state(con, p2, s)))
     return render_template("join.html", error=None)
 
@@ -572,11 +1033,8 @@ def join():
 @guard("lobby")
 def lobby():
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (g.participant["session_id"],)).fetchone()
-    joined = con.execute(
-        "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND joined=1",
-        (s["id"],)
-    ).fetchone()["c"]
+    s = g.session
+    joined = joined_count(con, s["id"])
     return render_template("lobby.html", session=s, participant=g.participant, joined=joined)
 
 @app.get("/lobby_status")
@@ -584,19 +1042,10 @@ def lobby_status():
     sid = request.args.get("session_id")
     pid = request.args.get("participant_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s, reset = poll_session(con, sid, pid)
     if not s:
         return jsonify({"err": "unknown_session"}), 404
-    joined = con.execute(
-        "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND joined=1",
-        (sid,)
-    ).fetchone()["c"]
-
-    reset = False
-    if pid:
-        p = con.execute("SELECT joined FROM participants WHERE id=%s", (pid,)).fetchone()
-        if p and not p["joined"]:
-            reset = True
+    joined = joined_count(con, sid)
 
     return jsonify({"joined": joined, "group_size": s["group_size"], "ready": joined >= s["group_size"], "reset": reset})
 
@@ -606,15 +1055,14 @@ def lobby_status():
 def round_view():
     con = db()
     p = g.participant
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+    s = g.session
     r = p["current_round"]
     ptype = p["ptype"] or 1
     N = s["group_size"]
 
     a_cost_display = a_cost_for(ptype)
     others_max = max(1, N - 1)
-    b_row_costs = [int(b_cost_adapt(ptype, k, N)) for k in range(1, others_max + 1)]
-    b_list = [{"others": k, "cost": b_row_costs[k-1]} for k in range(1, others_max + 1)]
+    b_list = b_cost_rows(ptype, N)
 
     return render_template(
         "round.html",
@@ -639,21 +1087,14 @@ def choose():
         return ("Invalid choice", 400)
     con = db()
     p = g.participant
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
-    r = p["current_round"]
-
-    already = con.execute(
-        "SELECT 1 FROM decisions WHERE participant_id=%s AND round_number=%s",
-        (p["id"], r)
-    ).fetchone()
-    if already:
-        return jsonify({"ok": True})
-
-    con.execute(
-        "INSERT INTO decisions (session_id, participant_id, round_number, choice, created_at) VALUES (%s,%s,%s,%s,%s)",
-        (s["id"], p["id"], r, choice, iso_utc(utc_now())),
+    # A repeated submit for the same round hits ux_participant_round and
+    # leaves the first choice in place.
+    cursor = con.execute(
+        SQL_INSERT_DECISION,
+        (p["session_id"], p["id"], p["current_round"], choice, db_now()),
     )
-    con.commit()
+    if cursor.rowcount:
+        forget_admin_status(p["session_id"])
     return jsonify({"ok": True})
 
 @app.route("/wait")
@@ -661,12 +1102,9 @@ def choose():
 def wait_view():
     con = db()
     p = g.participant
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+    s = g.session
     r = p["current_round"]
-    decided = con.execute(
-        "SELECT COUNT(*) c FROM decisions WHERE session_id=%s AND round_number=%s",
-        (s["id"], r)
-    ).fetchone()["c"]
+    decided = con.scalar(SQL_COUNT_DECISIONS, (s["id"], r))
     return render_template("wait.html", session=s, round_number=r, decided=decided, participant=p)
 
 @app.get("/round_status")
@@ -675,22 +1113,18 @@ def round_status():
     r = int(request.args.get("round"))
     pid = request.args.get("participant_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s, reset = poll_session(con, sid, pid)
     if not s:
         return jsonify({"err": "unknown_session"}), 404
-
-    reset = False
-    if pid:
-        p = con.execute("SELECT joined FROM participants WHERE id=%s", (pid,)).fetchone()
-        if p and not p["joined"]:
-            reset = True
     if reset:
         return jsonify({"reset": True})
 
-    decided = con.execute(
-        "SELECT COUNT(*) c FROM decisions WHERE session_id=%s AND round_number=%s",
-        (sid, r)
-    ).fetchone()["c"]
+    # Every decision belongs to a participant, so the decided count is the
+    # length of the decided players list and needs no COUNT(*) of its own.
+    decided_players = [row["join_number"] for row in con.execute(
+        SQL_DECIDED_PLAYERS, (sid, r)
+    ).fetchall()]
+    decided = len(decided_players)
     ready = decided >= s["group_size"]
 
     players_payload = []
@@ -699,20 +1133,15 @@ def round_status():
     if ready:
         try:
             _finalize_round_atomic(con, sid, r, s)
-        except pymysql.OperationalError:
-            pass
+        except pymysql.MySQLError:
+            # Another poll finalizes the round; this one reports what is
+            # committed so far.
+            app.logger.warning("Finalizing round %s of session %s failed", r, sid, exc_info=True)
 
-        rp = con.execute(
-            "SELECT * FROM round_phases WHERE session_id=%s AND round_number=%s",
-            (sid, r)
-        ).fetchone()
+        rp = con.execute(SQL_ROUND_PHASE, (sid, r)).fetchone()
         watch_ends_at = rp["watch_ends_at"] if rp else None
 
-        for row in con.execute("""
-             SELECT p.join_number, d.choice, d.total_cost, d.payout
-             FROM decisions d JOIN participants p ON p.id=d.participant_id
-             WHERE d.session_id=%s AND d.round_number=%s ORDER BY p.join_number
-        """, (sid, r)).fetchall():
+        for row in con.execute(SQL_ROUND_RESULTS, (sid, r)).fetchall():
             players_payload.append({
                 "player_no": row["join_number"],
                 "choice": row["choice"],
@@ -720,12 +1149,6 @@ def round_status():
                 "payout": row["payout"],
             })
 
-    decided_players = [row["join_number"] for row in con.execute(
-        "SELECT p.join_number FROM decisions d JOIN participants p ON p.id=d.participant_id "
-        "WHERE d.session_id=%s AND d.round_number=%s ORDER BY p.join_number",
-        (sid, r)
-    ).fetchall()]
-
     return jsonify({
         "decided": decided,
         "ready": ready,
@@ -740,7 +1163,7 @@ def round_status():
 def reveal():
     con = db()
     p = g.participant
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+    s = g.session
     r = p["current_round"] - 1
     if r < 1: return redirect(url_for("round_view"))
     is_last_round = (p["current_round"] > s["rounds"])
@@ -751,38 +1174,26 @@ def reveal_status():
     sid = request.args.get("session_id")
     r = int(request.args.get("round") or 0)
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s = con.execute(SQL_SESSION_BY_ID, (sid,)).fetchone()
     if not s or r < 1: return jsonify({"err":"bad"}), 400
 
-    ph = con.execute(
-        "SELECT decision_ends_at, watch_ends_at FROM round_phases WHERE session_id=%s AND round_number=%s",
-        (sid, r)
-    ).fetchone()
+    ph = con.execute(SQL_ROUND_PHASE, (sid, r)).fetchone()
     now = utc_now()
     if not ph:
         sec = int(s["reveal_window"] or 5)
         con.execute(
-            "REPLACE INTO round_phases (session_id,round_number,decision_ends_at,watch_ends_at,created_at) VALUES (%s,%s,%s,%s,%s)",
-            (sid, r, iso_utc(now), iso_utc(now + timedelta(seconds=sec)), iso_utc(now))
+            SQL_REPLACE_ROUND_PHASE,
+            (sid, r, iso_utc(now), iso_utc(now + timedelta(seconds=sec)), db_now())
         )
         con.commit()
         ends_at = iso_utc(now + timedelta(seconds=sec))
     else:
         ends_at = ph["watch_ends_at"] if ph["watch_ends_at"].endswith("Z") else ph["watch_ends_at"] + "Z"
 
-    con.execute(
-        "UPDATE decisions SET reveal=1 WHERE session_id=%s AND round_number=%s AND (reveal IS NULL OR reveal!=1)",
-        (sid, r)
-    )
+    con.execute(SQL_MARK_REVEALED, (sid, r))
     con.commit()
 
-    rows = con.execute("""
-        SELECT p.id as pid, p.code, p.join_number, d.choice, d.payout
-        FROM participants p
-        LEFT JOIN decisions d ON d.participant_id=p.id AND d.round_number=%s
-        WHERE p.session_id=%s
-        ORDER BY p.join_number, p.code
-    """, (r, sid)).fetchall()
+    rows = con.execute(SQL_REVEAL_PLAYERS, (r, sid)).fetchall()
 
     players = []
     me = None
@@ -797,10 +1208,7 @@ def reveal_status():
         if g.participant and row["pid"] == g.participant["id"]:
             me = obj
 
-    ph2 = con.execute(
-        "SELECT watch_ends_at FROM round_phases WHERE session_id=%s AND round_number=%s",
-        (sid, r)
-    ).fetchone()
+    ph2 = con.execute(SQL_ROUND_PHASE, (sid, r)).fetchone()
     phase = "watch"
     if ph2 and utc_now() >= parse_iso_utc(ph2["watch_ends_at"]):
         phase = "done"
@@ -816,33 +1224,31 @@ def confirm_ready():
         return ("No participant", 400)
     con = db()
     p = g.participant
-    con.execute("UPDATE participants SET ready_for_next=1 WHERE id=%s", (p["id"],))
-    con.commit()
+    # Single autocommitted statement; advancing happens when the pages see
+    # the whole group ready, so there is nothing else to do here. Repeated
+    # clicks match no row and leave the admin status cache alone.
+    cursor = con.execute(SQL_SET_READY, (p["id"],))
+    if cursor.rowcount:
+        forget_admin_status(p["session_id"])
     return jsonify({"ok": True})
 
 @app.get("/ready_status")
 def ready_status():
-    """Returns status of who is ready for the next round."""
+    """Returns status of who is ready for the next round.
+
+    Polled by the reveal page; unchanged snapshots are answered with an
+    empty 304 via the ETag.
+    """
     sid = request.args.get("session_id")
     pid = request.args.get("participant_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s, reset = poll_session(con, sid, pid)
     if not s:
         return jsonify({"err": "unknown_session"}), 404
-
-    reset = False
-    if pid:
-        p = con.execute("SELECT joined FROM participants WHERE id=%s", (pid,)).fetchone()
-        if p and not p["joined"]:
-            reset = True
     if reset:
         return jsonify({"reset": True})
 
-    rows = con.execute(
-        """SELECT p.id, p.join_number, p.ready_for_next
-           FROM participants p WHERE p.session_id=%s ORDER BY p.join_number""",
-        (sid,)
-    ).fetchall()
+    rows = con.execute(SQL_READY_PLAYERS, (sid,)).fetchall()
 
     ready_count = sum(1 for r in rows if r["ready_for_next"])
     all_ready = ready_count >= s["group_size"]
@@ -858,13 +1264,15 @@ def ready_status():
         if g.participant and row["id"] == g.participant["id"]:
             me_ready = is_ready
 
-    return jsonify({
+    resp = jsonify({
         "ready_count": ready_count,
         "group_size": s["group_size"],
         "all_ready": all_ready,
         "me_ready": me_ready,
         "players": players
     })
+    resp.add_etag()
+    return resp.make_conditional(request)
 
 # ---------- Feedback ----------
 @app.route("/feedback")
@@ -872,25 +1280,14 @@ def ready_status():
 def feedback():
     con = db()
     p = g.participant
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (p["session_id"],)).fetchone()
+    s = g.session
     r = p["current_round"] - 1
     if r < 1:
         return redirect(url_for("round_view"))
 
-    d = con.execute(
-        "SELECT choice, total_cost, payout, base_payout, b_cost_round, others_A "
-        "FROM decisions WHERE session_id=%s AND participant_id=%s AND round_number=%s",
-        (s["id"], p["id"], r),
-    ).fetchone()
-
-    decided_A = con.execute(
-        "SELECT COUNT(*) AS c FROM decisions WHERE session_id=%s AND round_number=%s AND choice='A'",
-        (s["id"], r),
-    ).fetchone()["c"]
-    decided_B = con.execute(
-        "SELECT COUNT(*) AS c FROM decisions WHERE session_id=%s AND round_number=%s AND choice='B'",
-        (s["id"], r),
-    ).fetchone()["c"]
+    d = con.execute(SQL_OWN_DECISION, (s["id"], p["id"], r)).fetchone()
+    # Both choice counts from one scan of the round's decisions.
+    counts = con.execute(SQL_CHOICE_COUNTS, (s["id"], r)).fetchone()
 
     ctx = dict(
         session=s,
@@ -902,8 +1299,8 @@ def feedback():
         base_payout=(d["base_payout"] if d else s["starting_balance"]),
         b_cost_round=(d["b_cost_round"] if d else None),
         others_A=(d["others_A"] if d else None),
-        decided_A=decided_A,
-        decided_B=decided_B,
+        decided_A=int(counts["a"]),
+        decided_B=int(counts["b"]),
         next_round=(not s["archived"]) and (p["current_round"] <= s["rounds"]),
     )
     return render_template("feedback.html", **ctx)
@@ -925,40 +1322,90 @@ def done():
     flask_session.pop("participant_id", None)
     return render_template("done.html", balance=balance, code=code)
 
+def plain_response(body: bytes, status: int = 200) -> Response:
+    return Response(body, status=status, content_type="text/plain; charset=utf-8")
+
 @app.get("/healthz")
 def healthz():
-    return "ok", 200
+    return plain_response(b"ok")
+
+# DB probe result is cached briefly so load balancer probes rarely hit MySQL.
+# The probe uses its own short-lived connection, so frequent probes never take
+# a slot from the request pool.
+DB_HEALTH_TTL = 5.0
+_db_health_checked_at = None
+
+@app.get("/ready")
+@app.get("/test_db")
+def test_db():
+    global _db_health_checked_at
+    now = time.monotonic()
+    if _db_health_checked_at is not None and now - _db_health_checked_at < DB_HEALTH_TTL:
+        return plain_response(b"ok")
+    try:
+        con = _connect_mysql()
+        try:
+            con.execute(SQL_SELECT_1).fetchone()
+        finally:
+            con.close()
+    except pymysql.MySQLError:
+        _db_health_checked_at = None
+        return plain_response(b"db unavailable", 503)
+    _db_health_checked_at = now
+    return plain_response(b"ok")
 
 
 # -------------------- Admin --------------------
+@lru_cache(maxsize=16)
+def cached_url_for(endpoint: str) -> str:
+    """url_for() for argument-less endpoints; call inside a request only."""
+    return url_for(endpoint)
+
 def require_admin():
     return bool(flask_session.get("admin_ok"))
 
-def _session_done(con, sid):
-    row = con.execute("SELECT group_size, rounds FROM sessions WHERE id=%s", (sid,)).fetchone()
-    if not row:
-        return False
-    grp = row["group_size"]
-    rmax = row["rounds"]
-    cnt = con.execute(
-        "SELECT COUNT(*) c FROM participants WHERE session_id=%s AND current_round > %s",
-        (sid, rmax)
-    ).fetchone()["c"]
-    return cnt >= grp
+# Failed admin logins per client address: addr -> (window start, count).
+LOGIN_MAX_FAILURES = 10
+LOGIN_WINDOW = 60
+_login_failures = {}
+_login_failures_lock = Lock()
+
+def _login_blocked(addr: str) -> bool:
+    with _login_failures_lock:
+        entry = _login_failures.get(addr)
+        if entry and time.monotonic() - entry[0] >= LOGIN_WINDOW:
+            del _login_failures[addr]
+            entry = None
+    return bool(entry) and entry[1] >= LOGIN_MAX_FAILURES
+
+def _record_failed_login(addr: str) -> None:
+    now = time.monotonic()
+    with _login_failures_lock:
+        # Drop expired windows of other addresses so the dict stays bounded
+        # by the addresses seen within one window.
+        for other in [a for a, (start, _) in _login_failures.items() if now - start >= LOGIN_WINDOW]:
+            del _login_failures[other]
+        start, count = _login_failures.get(addr, (now, 0))
+        _login_failures[addr] = (start, count + 1)
 
 @app.route("/admin_login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
-        if request.form.get("password") == ADMIN_PASSWORD:
+        addr = request.remote_addr or ""
+        if _login_blocked(addr):
+            return ("Too Many Requests", 429)
+        password = request.form.get("password", "")
+        if hmac.compare_digest(password.encode("utf-8"), ADMIN_PASSWORD.encode("utf-8")):
             flask_session["admin_ok"] = True
-            return redirect(url_for("admin"))
+            return redirect(cached_url_for("admin"))
+        _record_failed_login(addr)
         return render_template("admin_login.html", error="Falsches Passwort.", admin_tab_guard=True)
     return render_template("admin_login.html", error=None, admin_tab_guard=True)
 
 @app.route("/admin", methods=["GET", "POST"])
 def admin():
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     con = db()
 
     if request.method == "POST":
@@ -975,44 +1422,46 @@ def admin():
         cost_mode = "type_table"
 
         sid = str(uuid.uuid4())
+        con.begin()
         con.execute("""
             INSERT INTO sessions
               (id,name,group_size,rounds,cvac,alpha,cinf,subsidy,subsidy_amount,
-               starting_balance,created_at,archived,reveal_window,watch_time,cost_mode)
+               starting_balance,archived,reveal_window,watch_time,cost_mode,created_at)
             VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
         """, (
             sid, name, group_size, rounds, cvac, alpha, cinf, subsidy, subsidy_amount,
-            base_payout, iso_utc(utc_now()), 0, 5, 5, cost_mode
+            base_payout, 0, 5, 5, cost_mode, db_now()
         ))
 
-        for i in range(group_size):
-            pid = str(uuid.uuid4())
-            while True:
-                code = create_code(6)
-                if not con.execute("SELECT 1 FROM participants WHERE code=%s", (code,)).fetchone():
-                    break
-            ptype = (i % 6) + 1
-            theta = 0.0
-            lambd = 0.0
-            con.execute(
-                "INSERT INTO participants (id,session_id,code,theta,lambda,joined,join_number,current_round,balance,completed,created_at,ptype) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)",
-                (pid, sid, code, theta, lambd, 0, None, 1, base_payout, 0, iso_utc(utc_now()), ptype)
-            )
+        bulk_create_participants(con, sid, group_size, base_payout)
         con.commit()
-        return redirect(url_for("admin"))
+        return redirect(cached_url_for("admin"))
+
+    # Sessions and their participants in one LEFT JOIN, only the columns the
+    # dashboard renders; rows of one session are adjacent and grouped here.
+    rows = con.execute(
+        """SELECT s.id, s.name, s.group_size, s.rounds, s.starting_balance,
+                  s.watch_time, s.archived, p.code, p.current_round
+           FROM sessions s
+           LEFT JOIN participants p ON p.session_id = s.id
+           ORDER BY s.created_at DESC, s.id"""
+    ).fetchall()
 
-    rows = con.execute("SELECT * FROM sessions ORDER BY created_at DESC").fetchall()
     sessions_active, sessions_done, sessions_arch = [], [], []
-    for s in rows:
-        ps = con.execute("SELECT code FROM participants WHERE session_id=%s", (s["id"],)).fetchall()
-        sdict = {**dict(s), "participants": [dict(p) for p in ps]}
+    for _, group in groupby(rows, key=itemgetter("id")):
+        group = list(group)
+        first = group[0]
+        s = {k: first[k] for k in ("id", "name", "group_size", "rounds",
+                                   "starting_balance", "watch_time", "archived")}
+        s["participants"] = [{"code": p["code"]} for p in group if p["code"] is not None]
+        finished = sum(1 for p in group
+                       if p["current_round"] is not None and p["current_round"] > s["rounds"])
         if s["archived"]:
-            sessions_arch.append(sdict)
+            sessions_arch.append(s)
+        elif finished >= s["group_size"]:
+            sessions_done.append(s)
         else:
-            if _session_done(con, s["id"]):
-                sessions_done.append(sdict)
-            else:
-                sessions_active.append(sdict)
+            sessions_active.append(s)
 
     now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
     return render_template(
@@ -1024,14 +1473,42 @@ def admin():
         admin_tab_guard=True
     )
 
+@app.get("/admin/sessions_overview")
+def admin_sessions_overview():
+    """Session ids per dashboard bucket, polled by the admin page.
+
+    The response carries an ETag, so unchanged polls are answered with an
+    empty 304 instead of the full lists.
+    """
+    if not require_admin():
+        return ("Forbidden", 403)
+    con = db()
+    rows = con.execute(
+        """SELECT s.id, s.archived,
+                  (SELECT COUNT(*) FROM participants p
+                   WHERE p.session_id=s.id AND p.current_round > s.rounds) >= s.group_size AS done
+           FROM sessions s ORDER BY s.created_at DESC, s.id"""
+    ).fetchall()
+    overview = {"active": [], "done": [], "archived": []}
+    for row in rows:
+        if row["archived"]:
+            overview["archived"].append(row["id"])
+        elif row["done"]:
+            overview["done"].append(row["id"])
+        else:
+            overview["active"].append(row["id"])
+    resp = jsonify(overview)
+    resp.add_etag()
+    return resp.make_conditional(request)
+
 @app.get("/admin/session/<session_id>")
 def admin_session_view(session_id):
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (session_id,)).fetchone()
+    s = con.execute(SQL_SESSION_BY_ID, (session_id,)).fetchone()
     if not s:
-        return redirect(url_for("admin"))
+        return redirect(cached_url_for("admin"))
     r = con.execute(
         "SELECT MIN(current_round) AS r FROM participants WHERE session_id=%s",
         (session_id,)
@@ -1044,79 +1521,91 @@ def admin_session_status():
     if not require_admin():
         return ("Forbidden", 403)
     sid = request.args.get("session_id")
+    payload = cached_admin_status(sid)
+    if payload is not None:
+        return jsonify(payload)
     con = db()
-    srow = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
-    if not srow:
-        return jsonify({"participants": [], "decided_count": 0, "session": None})
-
-    r = con.execute(
-        "SELECT MIN(current_round) AS r FROM participants WHERE session_id=%s",
-        (sid,)
-    ).fetchone()["r"] or 1
-    r_disp = min(r, srow["rounds"])
-
+    # Session, current round (the slowest participant's), participants and
+    # their choices for that round in one round trip. The decisions join is
+    # answered from the (session_id, round_number, participant_id, choice)
+    # index.
     rows = con.execute(
-        """SELECT p.id, p.code, p.join_number, p.balance, p.current_round, p.ready_for_next,
-                  EXISTS(SELECT 1 FROM decisions d WHERE d.participant_id=p.id AND d.round_number=%s) AS decided,
-                  (SELECT d.choice FROM decisions d WHERE d.participant_id=p.id AND d.round_number=%s LIMIT 1) AS choice
-           FROM participants p WHERE p.session_id=%s ORDER BY p.join_number, p.code""",
-        (r, r, sid)
+        """SELECT s.id AS sid, s.rounds, mx.r,
+                  p.id, p.code, p.join_number, p.balance, p.current_round, p.ready_for_next,
+                  d.participant_id AS decided, d.choice
+           FROM sessions s
+           CROSS JOIN (SELECT COALESCE(MIN(current_round), 1) AS r
+                       FROM participants WHERE session_id=%s) mx
+           LEFT JOIN participants p ON p.session_id=s.id
+           LEFT JOIN decisions d
+             ON d.session_id=s.id AND d.round_number=mx.r AND d.participant_id=p.id
+           WHERE s.id=%s
+           ORDER BY p.join_number, p.code""",
+        (sid, sid)
     ).fetchall()
+    if not rows:
+        return jsonify({"participants": [], "decided_count": 0, "session": None})
+
+    rounds = rows[0]["rounds"]
+    r_disp = min(rows[0]["r"], rounds)
 
     participants = [{
         "id": rr["id"],
         "code": rr["code"],
         "player_no": rr["join_number"],
-        "balance": rr["balance"],
-        "round_display": min(rr["current_round"], srow["rounds"]),
-        "decided": bool(rr["decided"]),
+        "balance": float(rr["balance"]) if rr["balance"] is not None else None,
+        "round_display": min(rr["current_round"], rounds),
+        "decided": rr["decided"] is not None,
         "choice": rr["choice"],
         "ready_for_next": bool(rr["ready_for_next"])
-    } for rr in rows]
+    } for rr in rows if rr["id"] is not None]
 
     decided_count = sum(1 for x in participants if x["decided"])
     ready_count = sum(1 for x in participants if x["ready_for_next"])
-    return jsonify({
+    payload = {
         "participants": participants,
         "decided_count": decided_count,
         "ready_count": ready_count,
-        "session": {"id": srow["id"], "current_round": r_disp}
-    })
+        "session": {"id": rows[0]["sid"], "current_round": r_disp}
+    }
+    store_admin_status(sid, payload)
+    return jsonify(payload)
 
 @app.post("/admin/reset_session")
 def admin_reset_session():
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     sid = request.form.get("session_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
-    if not s:
-        return redirect(url_for("admin"))
-
-    con.execute("DELETE FROM decisions WHERE session_id=%s", (sid,))
-    con.execute("DELETE FROM round_phases WHERE session_id=%s", (sid,))
+    # Balances are reset from the session row in the same UPDATE, so the
+    # session does not have to be read first; an unknown id changes nothing.
+    con.begin()
+    con.execute(SQL_DELETE_DECISIONS, (sid,))
+    con.execute(SQL_DELETE_ROUND_PHASES, (sid,))
     con.execute(
-        "UPDATE participants SET current_round=1, join_number=NULL, joined=0, balance=%s, completed=0, ready_for_next=0 WHERE session_id=%s",
-        (s["starting_balance"], sid)
+        """UPDATE participants p JOIN sessions s ON s.id=p.session_id
+           SET p.current_round=1, p.join_number=NULL, p.joined=0, p.balance=s.starting_balance,
+               p.completed=0, p.ready_for_next=0
+           WHERE p.session_id=%s""",
+        (sid,)
     )
-    con.commit()
     con.execute("UPDATE sessions SET archived=0 WHERE id=%s", (sid,))
     con.commit()
-    return redirect(url_for("admin"))
+    forget_joined_count(sid)
+    forget_admin_status(sid)
+    return redirect(cached_url_for("admin"))
 
 @app.post("/admin/archive_session")
 def admin_archive_session():
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     sid = request.form.get("session_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s = con.execute(SQL_SESSION_BY_ID, (sid,)).fetchone()
     if not s:
-        return redirect(url_for("admin"))
+        return redirect(cached_url_for("admin"))
 
-    ensure_archive_schema(con, "sessions")
-    ensure_archive_schema(con, "participants")
-    ensure_archive_schema(con, "decisions")
+    ensure_archive_schema(con, ("sessions", "participants", "decisions"))
 
     con.execute("START TRANSACTION")
     con.execute("INSERT INTO archived_sessions SELECT * FROM sessions WHERE id=%s", (sid,))
@@ -1125,134 +1614,164 @@ def admin_archive_session():
     con.execute("UPDATE sessions SET archived=1 WHERE id=%s", (sid,))
     con.execute("UPDATE participants SET completed=1 WHERE session_id=%s", (sid,))
     con.commit()
-    return redirect(url_for("admin"))
+    return redirect(cached_url_for("admin"))
 
 @app.post("/admin/delete_session")
 def admin_delete_session():
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     sid = request.form.get("session_id")
     con = db()
-    exists = con.execute("SELECT 1 FROM sessions WHERE id=%s", (sid,)).fetchone()
-    if not exists:
-        return redirect(url_for("admin"))
-
-    con.execute("START TRANSACTION")
-    con.execute("DELETE FROM decisions WHERE session_id=%s", (sid,))
-    con.execute("DELETE FROM round_phases WHERE session_id=%s", (sid,))
+    # The child rows are deleted explicitly as well, so databases whose
+    # ON DELETE CASCADE keys have not been added yet leave nothing behind.
+    con.begin()
+    con.execute(SQL_DELETE_DECISIONS, (sid,))
+    con.execute(SQL_DELETE_ROUND_PHASES, (sid,))
     con.execute("DELETE FROM participants WHERE session_id=%s", (sid,))
     con.execute("DELETE FROM sessions WHERE id=%s", (sid,))
     con.commit()
-    return redirect(url_for("admin"))
+    return redirect(cached_url_for("admin"))
 
 # --------- XLSX Export ----------
-def _style_table(ws, header_row=1, wrap_cols=None, int_cols=None):
-    hdr_fill = PatternFill("solid", fgColor="1F2A44")
-    hdr_font = Font(bold=True, color="FFFFFF")
-    for cell in ws[header_row]:
-        cell.fill = hdr_fill
-        cell.font = hdr_font
-        cell.alignment = Alignment(vertical="center")
-
-    ws.freeze_panes = f"A{header_row+1}"
-    ws.auto_filter.ref = ws.dimensions
-
-    if int_cols:
-        for col_idx in int_cols:
-            col_letter = get_column_letter(col_idx)
-            for rr in range(header_row+1, ws.max_row+1):
-                ws[f"{col_letter}{rr}"].number_format = "0"
-
-    if wrap_cols:
-        for col_idx in wrap_cols:
-            col_letter = get_column_letter(col_idx)
-            for rr in range(header_row, ws.max_row+1):
-                ws[f"{col_letter}{rr}"].alignment = Alignment(wrap_text=True, vertical="top")
-
-    max_width = {}
-    for row in ws.iter_rows(values_only=False):
-        for cell in row:
-            length = len(str(cell.value)) if cell.value is not None else 0
-            max_width[cell.column] = max(max_width.get(cell.column, 0), length)
-
-    for col, width in max_width.items():
-        col_letter = get_column_letter(col)
-        ws.column_dimensions[col_letter].width = min(60, max(10, width * 1.15))
+XLSX_SPOOL_SIZE = 1 << 20
+
+_HDR_FILL = PatternFill("solid", fgColor="1F2A44")
+_HDR_FONT = Font(bold=True, color="FFFFFF")
+_HDR_ALIGN = Alignment(vertical="center")
+_WRAP_ALIGN = Alignment(wrap_text=True, vertical="top")
+
+def _write_table(ws, header, rows, wrap_cols=None, int_cols=None, widths=None):
+    """Write a header and rows to a write-only sheet styled as a table.
+
+    Write-only sheets emit column widths, panes and filters before the first
+    row, so they are set up front: widths come from the rows when they are a
+    list already in memory, otherwise from ``widths`` (expected characters per
+    column). Cell styles are attached to WriteOnlyCell objects as rows are
+    appended.
+    """
+    int_idx = {c - 1 for c in int_cols or ()}
+    wrap_idx = {c - 1 for c in wrap_cols or ()}
+
+    if widths is None:
+        widths = [len(str(h)) for h in header]
+        for row in rows:
+            for i, value in enumerate(row):
+                if value is not None:
+                    length = len(str(value))
+                    if length > widths[i]:
+                        widths[i] = length
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = min(60, max(10, width * 1.15))
+    ws.freeze_panes = "A2"
+
+    header_cells = []
+    for i, value in enumerate(header):
+        cell = WriteOnlyCell(ws, value=value)
+        cell.fill = _HDR_FILL
+        cell.font = _HDR_FONT
+        cell.alignment = _WRAP_ALIGN if i in wrap_idx else _HDR_ALIGN
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    styled = int_idx | wrap_idx
+    count = 0
+    for row in rows:
+        if styled:
+            row = list(row)
+            for i in styled:
+                cell = WriteOnlyCell(ws, value=row[i])
+                if i in int_idx:
+                    cell.number_format = "0"
+                if i in wrap_idx:
+                    cell.alignment = _WRAP_ALIGN
+                row[i] = cell
+        ws.append(row)
+        count += 1
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(header))}{count + 1}"
 
 @app.get("/admin/export_session_xlsx")
 def admin_export_session_xlsx():
     if not require_admin():
-        return redirect(url_for("admin_login"))
+        return redirect(cached_url_for("admin_login"))
     sid = request.args.get("session_id")
     con = db()
-    s = con.execute("SELECT * FROM sessions WHERE id=%s", (sid,)).fetchone()
+    s = con.execute(SQL_SESSION_BY_ID, (sid,)).fetchone()
     if not s:
         return ("Not found", 404)
 
-    wb = Workbook()
+    # Rows are streamed into the file as they are appended instead of being
+    # kept as a full in-memory cell model.
+    wb = Workbook(write_only=True)
 
-    ws0 = wb.active
-    ws0.title = "Session"
-    ws0.append(["id","name","group_size","rounds","starting_balance","created_at","archived"])
-    ws0.append([
+    _write_table(wb.create_sheet("Session"), ["id","name","group_size","rounds","starting_balance","created_at","archived"], [[
         s["id"], s["name"], s["group_size"], s["rounds"],
-        s["starting_balance"], s["created_at"], s["archived"]
-    ])
-    _style_table(ws0, header_row=1, wrap_cols=[6,7], int_cols=[3,4,5])
+        s["starting_balance"], created_iso(s["created_at"]), s["archived"]
+    ]], wrap_cols=[6,7], int_cols=[3,4,5])
 
-    ws1 = wb.create_sheet("Participants")
-    ws1.append(["player_no","code","ptype","joined","current_round","balance","completed","ready_for_next","created_at"])
-    for p in con.execute(
+    participants = con.execute(
         "SELECT join_number, code, ptype, joined, current_round, balance, completed, ready_for_next, created_at "
         "FROM participants WHERE session_id=%s ORDER BY join_number, code",
         (sid,)
-    ):
-        ws1.append([p["join_number"], p["code"], p["ptype"], p["joined"],
-                    p["current_round"], p["balance"], p["completed"], p["ready_for_next"], p["created_at"]])
-    _style_table(ws1, header_row=1, wrap_cols=[9], int_cols=[1,3,4,5,6,7,8])
-
-    ws2 = wb.create_sheet("Decisions")
-    ws2.append(["round","player_no","code","ptype","choice","a_cost","b_cost","total_cost",
-                "payout","created_at","revealed","others_A","b_cost_round","base_payout"])
-    for d in con.execute("""
+    )
+    _write_table(
+        wb.create_sheet("Participants"),
+        ["player_no","code","ptype","joined","current_round","balance","completed","ready_for_next","created_at"],
+        [[p["join_number"], p["code"], p["ptype"], p["joined"],
+          p["current_round"], p["balance"], p["completed"], p["ready_for_next"], created_iso(p["created_at"])]
+         for p in participants],
+        wrap_cols=[9], int_cols=[1,3,4,5,6,7,8]
+    )
+
+    # Decisions grow with rounds x group size, so they are streamed into the
+    # sheet rather than buffered first.
+    with con.stream("""
         SELECT d.round_number, p.join_number, p.code, p.ptype, d.choice,
                d.a_cost, d.b_cost, d.total_cost, d.payout, d.created_at, d.reveal,
                d.others_A, d.b_cost_round, d.base_payout
         FROM decisions d JOIN participants p ON p.id=d.participant_id
         WHERE d.session_id=%s ORDER BY d.round_number, p.join_number, p.code
-    """, (sid,)):
-        ws2.append([d["round_number"], d["join_number"], d["code"], d["ptype"], d["choice"],
-                    d["a_cost"], d["b_cost"], d["total_cost"], d["payout"], d["created_at"], d["reveal"],
-                    d["others_A"], d["b_cost_round"], d["base_payout"]])
-    _style_table(ws2, header_row=1, wrap_cols=[10], int_cols=[1,2,4,6,7,8,9,11,12,13,14])
-
-    ws3 = wb.create_sheet("Design")
-    ws3.append(["Parameter","Wert","Kommentar"])
-    for k, v, c in [
-        ("Session ID", s["id"], ""),
-        ("Session Name", s["name"], ""),
-        ("Gruppengroesse (N)", s["group_size"], "Anzahl Teilnehmende pro Gruppe"),
-        ("Runden", s["rounds"], "Anzahl Perioden; Parameter konstant"),
-        ("Basisbetrag M", s["starting_balance"], "Rundenstart; Auszahlung = M - Kosten"),
-        ("Erstellt (UTC)", s["created_at"], ""),
-        ("Archiviert", s["archived"], "1 = archiviert"),
-    ]:
-        ws3.append([k, v, c])
-    _style_table(ws3, header_row=1, wrap_cols=[2,3])
-
-    ws4 = wb.create_sheet("TypeCostTable")
-    ws4.append(["Typ","A_cost","B_cost_1A","B_cost_2A","B_cost_3A","B_cost_4A","B_cost_5A"])
-    for t in sorted(TYPE_COST.keys()):
-        ws4.append([t, TYPE_COST[t]["A"], *TYPE_COST[t]["B"][:5]])
-    _style_table(ws4, header_row=1, int_cols=[1,2,3,4,5,6,7])
-
-    ws5 = wb.create_sheet("RoundSettings")
-    ws5.append(["round","M","N"])
-    for rr in range(1, int(s["rounds"]) + 1):
-        ws5.append([rr, s["starting_balance"], s["group_size"]])
-    _style_table(ws5, header_row=1, int_cols=[1,2,3])
-
-    buf = io.BytesIO()
+    """, (sid,)) as decisions:
+        _write_table(
+            wb.create_sheet("Decisions"),
+            ["round","player_no","code","ptype","choice","a_cost","b_cost","total_cost",
+             "payout","created_at","revealed","others_A","b_cost_round","base_payout"],
+            ([d["round_number"], d["join_number"], d["code"], d["ptype"], d["choice"],
+              d["a_cost"], d["b_cost"], d["total_cost"], d["payout"], created_iso(d["created_at"]), d["reveal"],
+              d["others_A"], d["b_cost_round"], d["base_payout"]]
+             for d in decisions),
+            wrap_cols=[10], int_cols=[1,2,4,6,7,8,9,11,12,13,14],
+            # Streamed rows cannot be measured up front; created_at holds a
+            # 20 character ISO timestamp, the other columns fit the minimum.
+            widths=[10, 10, 10, 10, 10, 10, 10, 10, 10, 20, 10, 10, 12, 11]
+        )
+
+    _write_table(wb.create_sheet("Design"), ["Parameter","Wert","Kommentar"], [
+        ["Session ID", s["id"], ""],
+        ["Session Name", s["name"], ""],
+        ["Gruppengroesse (N)", s["group_size"], "Anzahl Teilnehmende pro Gruppe"],
+        ["Runden", s["rounds"], "Anzahl Perioden; Parameter konstant"],
+        ["Basisbetrag M", s["starting_balance"], "Rundenstart; Auszahlung = M - Kosten"],
+        ["Erstellt (UTC)", created_iso(s["created_at"]), ""],
+        ["Archiviert", s["archived"], "1 = archiviert"],
+    ], wrap_cols=[2,3])
+
+    _write_table(
+        wb.create_sheet("TypeCostTable"),
+        ["Typ","A_cost","B_cost_1A","B_cost_2A","B_cost_3A","B_cost_4A","B_cost_5A"],
+        TYPE_COST_ROWS,
+        int_cols=[1,2,3,4,5,6,7]
+    )
+
+    _write_table(
+        wb.create_sheet("RoundSettings"),
+        ["round","M","N"],
+        [[rr, s["starting_balance"], s["group_size"]] for rr in range(1, int(s["rounds"]) + 1)],
+        int_cols=[1,2,3]
+    )
+
+    # Small exports stay in memory, large ones spill to disk; send_file
+    # streams the file instead of copying it into one bytes object.
+    buf = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_SIZE)
     wb.save(buf)
     buf.seek(0)
     filename = f"session_{s['name'].replace(' ', '_')}_{s['id'][:8]}.xlsx"
@@ -1264,6 +1783,14 @@ def admin_export_session_xlsx():
     )
 
 # -------------------- Run --------------------
+# Schema setup and migrations run once per deployment: from the gunicorn
+# master (see gunicorn.conf.py), with "flask --app app_ALT init-db", or
+# below for the development server.
+@app.cli.command("init-db")
+def init_db_command():
+    """Create missing tables and apply schema migrations."""
+    init_db()
+
 if __name__ == "__main__":
     init_db()
     app.run(host="127.0.0.1", port=5000, debug=DEBUG_MODE)
@@ -1,29 +1,59 @@
+import os
+
+# Set the ASYNC_MODE environment variable to "threading", "eventlet" or
+# "gevent" to test the different async modes. The eventlet and gevent modes
+# monkey patch the standard library before anything else is imported, so that
+# sockets, locks and sleeps cooperate with the green thread hub.
+async_mode = os.environ.get('ASYNC_MODE', 'eventlet')
+if async_mode == 'eventlet':
+    import eventlet
+    eventlet.monkey_patch()
+elif async_mode == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+from collections import defaultdict
 from threading import Lock
-from flask import Flask, render_template, session, request
+from flask import Flask, render_template, request
 from flask_socketio import SocketIO, Namespace, emit, join_room, leave_room, \
     close_room, rooms, disconnect
-
-# Set this variable to "threading", "eventlet" or "gevent" to test the
-# different async modes, or leave it set to None for the application to choose
-# the best option based on installed packages.
-async_mode = None
+from orjson_json import OrjsonJSON
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'secret!'
-socketio = SocketIO(app, async_mode=async_mode)
+socketio = SocketIO(app, async_mode=async_mode, json=OrjsonJSON)
 thread = None
 thread_lock = Lock()
+# receive counts per client sid, kept out of the session so that handlers do
+# not write the session on every event
+receive_counts = defaultdict(int)
+
+
+def has_clients(namespace='/'):
+    """Return True if any client is connected to namespace on this server."""
+    return bool(socketio.server.manager.rooms.get(namespace))
 
 
 def background_thread():
-    """Example of how to send server generated events to clients."""
+    """Example of how to send server generated events to clients.
+
+    Ticks without a connected client are skipped.
+    """
     count = 0
     while True:
         socketio.sleep(10)
+        if not has_clients():
+            continue
         count += 1
         socketio.emit('my_response',
-                      {'data': 'Server generated event', 'count': count},
-                      namespace='/test')
+                      {'data': 'Server generated event', 'count': count})
+
+
+def bump_count():
+    """Increment the receive count of the current client and return it."""
+    count = receive_counts[request.sid] + 1
+    receive_counts[request.sid] = count
+    return count
 
 
 @app.route('/')
@@ -33,52 +63,49 @@ def index():
 
 class MyNamespace(Namespace):
     def on_my_event(self, message):
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
-             {'data': message['data'], 'count': session['receive_count']})
+             {'data': message['data'], 'count': count})
 
     def on_my_broadcast_event(self, message):
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
-             {'data': message['data'], 'count': session['receive_count']},
+             {'data': message['data'], 'count': count},
              broadcast=True)
 
     def on_join(self, message):
         join_room(message['room'])
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
              {'data': 'In rooms: ' + ', '.join(rooms()),
-              'count': session['receive_count']})
+              'count': count})
 
     def on_leave(self, message):
         leave_room(message['room'])
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
              {'data': 'In rooms: ' + ', '.join(rooms()),
-              'count': session['receive_count']})
+              'count': count})
 
     def on_close_room(self, message):
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response', {'data': 'Room ' + message['room'] + ' is closing.',
-                             'count': session['receive_count']},
+                             'count': count},
              room=message['room'])
         close_room(message['room'])
 
     def on_my_room_event(self, message):
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
-             {'data': message['data'], 'count': session['receive_count']},
+             {'data': message['data'], 'count': count},
              room=message['room'])
 
     def on_disconnect_request(self):
-        session['receive_count'] = session.get('receive_count', 0) + 1
+        count = bump_count()
         emit('my_response',
-             {'data': 'Disconnected!', 'count': session['receive_count']})
+             {'data': 'Disconnected!', 'count': count})
         disconnect()
 
-    def on_my_ping(self):
-        emit('my_pong')
-
     def on_connect(self):
         global thread
         with thread_lock:
@@ -87,6 +114,7 @@ class MyNamespace(Namespace):
         emit('my_response', {'data': 'Connected', 'count': 0})
 
     def on_disconnect(self):
+        receive_counts.pop(request.sid, None)
         print('Client disconnected', request.sid)
 
 
@@ -0,0 +1,34 @@
+# Gunicorn settings for the example applications.
+#
+#   gunicorn -c gunicorn.conf.py app_ALT:app
+#
+# The plain Flask game (app_ALT.py) can run one worker per core, set with
+# WEB_CONCURRENCY=$(nproc). The Socket.IO examples need sticky sessions, so
+# they must keep a single worker per instance; scale those out with several
+# instances and a message queue (see REDIS_URL in app.py).
+#
+# The master creates one listening socket that all forked workers inherit, so
+# within one instance the workers share a single accept queue; reuse_port
+# does not balance between them. What reuse_port does allow is starting
+# several gunicorn instances on the same address, each with its own listener,
+# and the kernel then spreads new connections across those instances. For
+# high connection churn also raise the kernel limits on the host, e.g.:
+#
+#   sysctl -w net.core.somaxconn=4096
+#   sysctl -w net.ipv4.tcp_tw_reuse=1
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = 'eventlet'
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', '2000'))
+reuse_port = True
+backlog = 4096
+
+
+def on_starting(server):
+    """Run the game's schema setup and migrations once, in the master,
+    before any worker serves a request."""
+    if getattr(server.app, 'app_uri', '').split(':')[0] == 'app_ALT':
+        from app_ALT import init_db
+        init_db()
@@ -0,0 +1,12 @@
+import orjson
+
+
+class OrjsonJSON:
+    """orjson based replacement for the json module used to encode packets."""
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj).decode('utf-8')
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)